@@ -0,0 +1,90 @@
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from soundfile import write
+
+
+# Output encodings: name -> (file extension, container format, subtype)
+ENCODINGS = {
+    "float": ("wav", "WAV", "FLOAT"),
+    "pcm24": ("wav", "WAV", "PCM_24"),
+    "pcm16": ("wav", "WAV", "PCM_16"),
+    "flac24": ("flac", "FLAC", "PCM_24"),
+    "flac16": ("flac", "FLAC", "PCM_16"),
+}
+
+
+def bit_depth(encoding):
+    """
+    Number of bits per sample of an encoding (32 for float).
+    """
+    subtype = ENCODINGS[encoding][2]
+    return 32 if subtype == "FLOAT" else int(subtype.split("_")[-1])
+
+def quantization_error(encoding):
+    """
+    Upper bound of the absolute error |x - decode(encode(x))| for signals with |x| <= 1.
+
+    For the integer encodings this is one LSB, i.e. 2^-15 (-90.3 dBFS) for 16 bit and
+    2^-23 (-138.5 dBFS) for 24 bit. libsndfile scales by 2^(bits-1) on both encoding and decoding
+    and saturates at the positive full scale (2^(bits-1) - 1) / 2^(bits-1). Depending on the
+    libsndfile version the scaled samples are rounded or truncated, so samples below full scale are
+    off by less than one LSB, while a sample at +1.0 is saturated and off by exactly one LSB.
+    For float it is the rounding error of float32, i.e. 2^-24.
+    FLAC is lossless, so flac16/flac24 have the same bound as pcm16/pcm24.
+    """
+    if ENCODINGS[encoding][2] == "FLOAT":
+        return 2.0**-24
+    return 2.0**-(bit_depth(encoding) - 1)
+
+def check_headroom(signal, encoding, file=""):
+    """
+    Raise a ValueError if the signal contains NaN or inf values or would clip with an integer encoding,
+    i.e. if its peak exceeds 0 dBFS. Return the remaining headroom in dB.
+    """
+    if not np.all(np.isfinite(signal)):
+        raise ValueError(f"{file} contains NaN or inf values")
+    peak = np.max(np.abs(signal)) if len(signal) > 0 else 0.0
+    headroom = -20*np.log10(peak) if peak > 0 else np.inf
+    if ENCODINGS[encoding][2] != "FLOAT" and peak > 1.0:
+        raise ValueError(f"{file} has a peak of {peak:.6f} ({-headroom:+.4f} dBFS) and would clip with encoding {encoding}")
+    return headroom
+
+
+class AudioWriter:
+    """
+    Write audio files with a fixed encoding. The headroom is checked before writing. FLAC files are
+    encoded in num_workers threads (libsndfile releases the GIL), all other encodings are written directly.
+    """
+
+    def __init__(self, encoding="float", num_workers=4):
+        assert encoding in ENCODINGS, f"Unknown encoding {encoding}, choose from {list(ENCODINGS)}"
+        self.encoding = encoding
+        self.extension, self.format, self.subtype = ENCODINGS[encoding]
+        self.num_workers = num_workers
+        self.executor = ThreadPoolExecutor(num_workers) if self.format == "FLAC" and num_workers > 0 else None
+        self.pending = deque()
+
+    def write(self, file, signal, sr):
+        check_headroom(signal, self.encoding, file)
+        if self.executor is None:
+            write(file, signal, sr, format=self.format, subtype=self.subtype)
+            return
+        # Limit the number of queued files to bound memory usage
+        while len(self.pending) >= 2*self.num_workers:
+            self.pending.popleft().result()
+        # Copy, as the caller may modify the signal in place after this returns
+        self.pending.append(self.executor.submit(write, file, np.array(signal), sr, format=self.format, subtype=self.subtype))
+
+    def flush(self):
+        """
+        Wait until all queued files are written and raise the first error if any.
+        """
+        while len(self.pending) > 0:
+            self.pending.popleft().result()
+
+    def close(self):
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
@@ -0,0 +1,315 @@
+import csv
+import numpy as np
+
+from os.path import join, exists
+from argparse import ArgumentParser
+from soundfile import info
+from ears_codecs import ENCODINGS
+
+
+# Emotions and speaking styles, shared with the generation scripts
+EMOTIONS_STYLES = [
+    "adoration",
+    "amazement",
+    "amusement",
+    "anger",
+    "confusion",
+    "contentment",
+    "cuteness",
+    "desire",
+    "disappointment",
+    "disgust",
+    "distress",
+    "embarassment",
+    "extasy",
+    "fast",
+    "fear",
+    "guilt",
+    "highpitch",
+    "interest",
+    "loud",
+    "lowpitch",
+    "neutral",
+    "pain",
+    "pride",
+    "realization",
+    "relief",
+    "regular",
+    "sadness",
+    "serenity",
+    "slow",
+    "whisper"
+]
+# Label in the index for speech files without an emotion/style (find_emotion_style returns None)
+NO_STYLE = "none"
+
+# Row layout of the index for both datasets. Strings are stored as indices into interned tables.
+COMMON_FIELDS = [
+    ("id", np.int32),
+    ("speaker", np.int16),
+    ("speech_file", np.int32),
+    ("style", np.int16),
+    ("speech_start", np.int64),
+    ("speech_end", np.int64),
+    ("num_samples", np.int64),
+    ("source", np.int32),
+]
+WHAM_FIELDS = COMMON_FIELDS + [
+    ("noise_start", np.int64),
+    ("noise_end", np.int64),
+    ("snr_dB", np.float32),
+]
+REVERB_FIELDS = COMMON_FIELDS + [
+    ("channel", np.int32),
+    ("gain", np.float64),
+    ("rt60", np.float32),
+]
+
+
+def find_emotion_style(speech_file, emotions_styles=EMOTIONS_STYLES):
+    for emo_style in emotions_styles:
+        if emo_style.lower() in speech_file.lower():
+            return emo_style
+    return None
+
+def intern(values):
+    """
+    Return the sorted table of unique strings and the index of each value into it.
+    """
+    table, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return table, inverse
+
+def audio_file(dataset, subset, speaker, id, row, encoding="float"):
+    """
+    Relative path of the noisy/reverberant file written by save_files for one CSV row.
+    """
+    extension = ENCODINGS[encoding][0]
+    if dataset == "wham":
+        return join(subset, "noisy", speaker, f"{id:05}_{row['snr_dB']:.1f}dB.{extension}")
+    return join(subset, "reverberant", speaker, f"{id:05}_{row['rt60']:.2f}.{extension}")
+
+
+class EarsIndex:
+    """
+    Columnar index over one subset of EARS-WHAM or EARS-Reverb.
+
+    The index holds a numpy structured array with one row per generated file, interned string
+    tables for speakers, speech files, noise/RIR files and emotions/styles and the encoding of the
+    audio files. It is stored as an uncompressed npz next to the CSV files so that loading it does
+    not involve any parsing.
+    """
+
+    def __init__(self, data, speakers, speech_files, sources, styles, dataset, subset, sr, encoding="float"):
+        self.data = data
+        self.speakers = speakers
+        self.speech_files = speech_files
+        self.sources = sources
+        self.styles = styles
+        self.dataset = dataset
+        self.subset = subset
+        self.sr = sr
+        self.encoding = encoding
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, column):
+        return self.data[column]
+
+    @classmethod
+    def from_csv(cls, target_dir, subset, sr=48000):
+        """
+        Build the index from {subset}.csv in target_dir. For EARS-WHAM the length of each file is
+        noise_end - noise_start. For EARS-Reverb, rows which were saved until the end of the speech file
+        (speech_end == -1) get their length from the header of the audio file, or -1 if it does not exist.
+        """
+        with open(join(target_dir, f"{subset}.csv"), "r") as text_file:
+            reader = csv.DictReader(text_file)
+            rows = list(reader)
+
+        if "snr_dB" in reader.fieldnames:
+            dataset, fields, source_key = "wham", WHAM_FIELDS, "noise_file"
+        else:
+            dataset, fields, source_key = "reverb", REVERB_FIELDS, "rir_file"
+
+        # CSVs written before the encoding column was added contain float wav files
+        encodings = set(row.get("encoding", "float") for row in rows)
+        assert len(encodings) <= 1, f"Mixed encodings {encodings} in {subset}.csv"
+        encoding = encodings.pop() if len(encodings) > 0 else "float"
+
+        speakers, speaker_index = intern([row["speaker"] for row in rows])
+        speech_files, speech_file_index = intern([row["speech_file"] for row in rows])
+        sources, source_index = intern([row[source_key] for row in rows])
+        styles = np.asarray(EMOTIONS_STYLES + [NO_STYLE], dtype=str)
+        style_lookup = {style: i for i, style in enumerate(styles)}
+
+        data = np.zeros(len(rows), dtype=fields)
+        data["speaker"] = speaker_index
+        data["speech_file"] = speech_file_index
+        data["source"] = source_index
+        for name, dtype in fields:
+            if name in ["speaker", "speech_file", "style", "num_samples", "source"]:
+                continue
+            data[name] = np.asarray([row[name] for row in rows], dtype=np.float64).astype(dtype)
+        data["style"] = [style_lookup[find_emotion_style(speech_file) or NO_STYLE] for speech_file in speech_files[speech_file_index]]
+
+        if dataset == "wham":
+            # save_files writes noise_end = noise_start + len(mixture)
+            data["num_samples"] = data["noise_end"] - data["noise_start"]
+        else:
+            num_samples = data["speech_end"] - data["speech_start"]
+            for i in np.flatnonzero(data["speech_end"] < 0):
+                row = data[i]
+                file = join(target_dir, audio_file(dataset, subset, speakers[row["speaker"]], row["id"], row, encoding))
+                num_samples[i] = info(file).frames if exists(file) else -1
+            data["num_samples"] = num_samples
+
+        return cls(data, speakers, speech_files, sources, styles, dataset, subset, sr, encoding)
+
+    @classmethod
+    def load(cls, file):
+        # Indices written before the encoding was stored refer to float wav files
+        with np.load(file, allow_pickle=False) as npz:
+            return cls(npz["data"], npz["speakers"], npz["speech_files"], npz["sources"], npz["styles"],
+                       npz["dataset"].item(), npz["subset"].item(), npz["sr"].item(),
+                       npz["encoding"].item() if "encoding" in npz.files else "float")
+
+    def save(self, file):
+        np.savez(file, data=self.data, speakers=self.speakers, speech_files=self.speech_files,
+                 sources=self.sources, styles=self.styles, dataset=np.asarray(self.dataset),
+                 subset=np.asarray(self.subset), sr=np.asarray(self.sr),
+                 encoding=np.asarray(self.encoding))
+
+    @property
+    def duration(self):
+        """
+        Duration of each row in seconds. Negative for EARS-Reverb rows whose length could not be
+        determined, these rows are excluded by select with a duration bound and by bucket_batches.
+        """
+        return self.data["num_samples"] / self.sr
+
+    def path(self, i, kind=None):
+        """
+        Relative path of the noisy/reverberant file of row i, or of the clean file if kind is "clean".
+        """
+        row = self.data[i]
+        speaker = self.speakers[row["speaker"]]
+        if kind == "clean":
+            return join(self.subset, "clean", speaker, f"{row['id']:05}.{ENCODINGS[self.encoding][0]}")
+        return audio_file(self.dataset, self.subset, speaker, row["id"], row, self.encoding)
+
+    def select(self, speakers=None, styles=None, min_duration=None, max_duration=None, **ranges):
+        """
+        Return the indices of all rows matching the given speakers, emotions/styles, duration
+        range in seconds and ranges (min, max) for numeric columns, e.g. snr_dB=(0, 10) or rt60=(0.2, 1.0).
+        Bounds given as None are not checked. Rows of unknown duration are dropped if a duration bound is given.
+        """
+        mask = np.ones(len(self.data), dtype=bool)
+        if speakers is not None:
+            mask &= np.isin(self.data["speaker"], np.flatnonzero(np.isin(self.speakers, speakers)))
+        if styles is not None:
+            mask &= np.isin(self.data["style"], np.flatnonzero(np.isin(self.styles, styles)))
+        if min_duration is not None or max_duration is not None:
+            mask &= self.data["num_samples"] >= 0
+        ranges["duration"] = (min_duration, max_duration)
+        for column, (low, high) in ranges.items():
+            values = self.duration if column == "duration" else self.data[column]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return np.flatnonzero(mask)
+
+    def row_indices(self, indices=None):
+        """
+        Return the given row indices as an integer array (all rows if None) and raise a ValueError if it is empty.
+        """
+        indices = np.arange(len(self.data)) if indices is None else np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            raise ValueError("No rows to sample from, the selection is empty")
+        return indices
+
+    def balanced_sample(self, groups, num_samples, indices=None, rng=None):
+        """
+        Sample num_samples row indices (with replacement) such that every non-empty group is
+        equally likely. groups is an integer label per row of the index, e.g. self["speaker"].
+        """
+        rng = np.random.default_rng(rng)
+        indices = self.row_indices(indices)
+        labels, inverse, counts = np.unique(np.asarray(groups)[indices], return_inverse=True, return_counts=True)
+        # Rows sorted by group, so that each group is a contiguous slice
+        order = indices[np.argsort(inverse, kind="stable")]
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        chosen = rng.integers(len(labels), size=num_samples)
+        return order[offsets[chosen] + (rng.random(num_samples) * counts[chosen]).astype(np.int64)]
+
+    def stratified_sample(self, column, bins, num_samples, indices=None, rng=None):
+        """
+        Sample num_samples row indices uniformly over the bins of a numeric column,
+        e.g. stratified_sample("rt60", np.linspace(0, 2, 9), 1000).
+        The last bin includes its right edge, all other bins are half-open [low, high).
+        Rows outside of the bin edges are never sampled.
+        """
+        values = self.duration if column == "duration" else self.data[column]
+        bin_index = np.digitize(values, bins)
+        bin_index[values == bins[-1]] = len(bins) - 1
+        indices = self.row_indices(indices)
+        indices = indices[(bin_index[indices] > 0) & (bin_index[indices] < len(bins))]
+        if len(indices) == 0:
+            raise ValueError(f"No rows with {column} within [{bins[0]}, {bins[-1]}]")
+        return self.balanced_sample(bin_index, num_samples, indices=indices, rng=rng)
+
+    def bucket_batches(self, batch_size=None, max_batch_seconds=None, num_buckets=10, indices=None, shuffle=True, rng=None):
+        """
+        Group rows into batches of similar duration. Rows are split into num_buckets duration
+        quantiles and batched within each bucket, either by a fixed batch_size or by a maximum
+        total duration max_batch_seconds. Rows of unknown duration are dropped. Returns a list of index arrays.
+        """
+        assert (batch_size is None) != (max_batch_seconds is None), "Specify either batch_size or max_batch_seconds"
+        rng = np.random.default_rng(rng)
+        indices = self.row_indices(indices)
+        indices = indices[self.data["num_samples"][indices] >= 0]
+        if len(indices) == 0:
+            raise ValueError("No rows of known duration to batch")
+        if shuffle:
+            indices = rng.permutation(indices)
+        duration = self.duration[indices]
+        edges = np.quantile(duration, np.linspace(0, 1, num_buckets + 1)[1:-1])
+        bucket = np.digitize(duration, edges)
+
+        batches = []
+        for b in range(num_buckets):
+            members = indices[bucket == b]
+            if batch_size is not None:
+                batches += [members[i:i+batch_size] for i in range(0, len(members), batch_size)]
+            else:
+                # Pad every batch to its longest member
+                members = members[np.argsort(self.duration[members], kind="stable")]
+                start = 0
+                for end in range(1, len(members) + 1):
+                    if end - start > 1 and (end - start) * self.duration[members[end-1]] > max_batch_seconds:
+                        batches.append(members[start:end-1])
+                        start = end - 1
+                if start < len(members):
+                    batches.append(members[start:])
+        if shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+
+def save_index(target_dir, subset, sr=48000):
+    index = EarsIndex.from_csv(target_dir, subset, sr=sr)
+    index.save(join(target_dir, f"{subset}.npz"))
+    return index
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--dataset_dir", type=str, required=True, help="Path to generated EARS-WHAM or EARS-Reverb directory")
+    parser.add_argument("--subsets", type=str, nargs="+", default=["train", "valid", "test"], help="Subsets to index")
+    parser.add_argument("--sr", type=int, default=48000, help="Sampling rate")
+    args = parser.parse_args()
+
+    for subset in args.subsets:
+        index = save_index(args.dataset_dir, subset, sr=args.sr)
+        print(f"Indexed {len(index)} files of {subset} split")
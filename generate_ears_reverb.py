@@ -9,21 +9,23 @@ from glob import glob
 from os import listdir, makedirs
 from os.path import join, isdir, exists
 from argparse import ArgumentParser
-from soundfile import read, write
+from soundfile import read
 from tqdm import tqdm
 from scipy.signal import convolve
 from scipy import stats
 from librosa import resample
+from ears_index import save_index
+from ears_codecs import ENCODINGS, AudioWriter
 
 
 def save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, rir_file, channel, 
-               gain, rt60, mixture, speech, args):
+               gain, rt60, mixture, speech, writer, args):
     with open(join(target_dir, f"{subset}.csv"), "a") as text_file:
         text_file.write(f"{id:05},{speaker},{speech_file.split('/')[-1][:-4]},{speech_start},{speech_end},"
-            + f"{rir_file.replace(args.data_dir, '')},{channel},{gain},{rt60:.2f}\n")
-    write(join(target_dir, subset, "reverberant", speaker, f"{id:05}_{rt60:.2f}.wav"), mixture, args.sr, subtype="FLOAT")
+            + f"{rir_file.replace(args.data_dir, '')},{channel},{gain},{rt60:.2f},{writer.encoding}\n")
+    writer.write(join(target_dir, subset, "reverberant", speaker, f"{id:05}_{rt60:.2f}.{writer.extension}"), mixture, args.sr)
     if args.copy_clean:
-        write(join(target_dir, subset, "clean", speaker, f"{id:05}.wav"), speech, args.sr, subtype="FLOAT")
+        writer.write(join(target_dir, subset, "clean", speaker, f"{id:05}.{writer.extension}"), speech, args.sr)
     id += 1
     return id
 
@@ -85,6 +87,8 @@ if __name__ == '__main__':
     parser.add_argument("--ramp_time_in_ms", type=int, default=10, help="Ramp time in ms")
     parser.add_argument("--max_rt60", type=float, default=2.0, help="Maximum RT60 in seconds")
     parser.add_argument("--max_time_test_set_in_s", type=int, default=29, help="Maximum time in seconds for the test set")
+    parser.add_argument("--encoding", type=str, default="float", choices=list(ENCODINGS), help="Encoding of the output audio files")
+    parser.add_argument("--num_workers", type=int, default=4, help="Number of threads for FLAC encoding")
     args = parser.parse_args()
 
     # Reproducibility
@@ -151,12 +155,13 @@ if __name__ == '__main__':
     rir_files += sorted(glob(join(dir, "**", "*.wav"), recursive=True))
 
     meter = pyln.Meter(args.sr)
+    writer = AudioWriter(args.encoding, num_workers=args.num_workers)
     
     # Select speech files for split
     for subset in ["train", "valid"]:
         print(f"Generate {subset} split")
         with open(join(target_dir, f"{subset}.csv"), "w") as text_file:
-            text_file.write(f"id,speaker,speech_file,speech_start,speech_end,rir_file,channel,gain,rt60\n")
+            text_file.write(f"id,speaker,speech_file,speech_start,speech_end,rir_file,channel,gain,rt60,encoding\n")
         speech_files = []
         for speaker in speakers[subset]:  
             speech_files += sorted(glob(join(speech_dir, speaker, "*.wav")))
@@ -249,19 +254,22 @@ if __name__ == '__main__':
                     mixture = long_mixture[speech_start:speech_end]
                     speech = long_speech[speech_start:speech_end]
                     id = save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, rir_file,
-                                    channel, gain, rt60, mixture, speech, args)
+                                    channel, gain, rt60, mixture, speech, writer, args)
                 speech_start = (num_splits - 1)*int(args.cut_length*args.sr)
                 speech_end = -1
                 mixture = long_mixture[speech_start:speech_end]
                 speech = long_speech[speech_start:speech_end]
                 id = save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, rir_file,
-                                channel, gain, rt60, mixture, speech, args)
+                                channel, gain, rt60, mixture, speech, writer, args)
             else:
                 speech_start = 0
                 speech_end = -1
                 id = save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, rir_file,
-                                channel, gain, rt60, mixture, speech, args)
-    
+                                channel, gain, rt60, mixture, speech, writer, args)
+
+        writer.flush()
+        save_index(target_dir, subset, sr=args.sr)
+
     # ramps at beginning and end
     ramp_duration = args.ramp_time_in_ms / 1000
     ramp_samples = int(ramp_duration * args.sr)
@@ -272,7 +280,7 @@ if __name__ == '__main__':
         data = json.load(json_file)
 
     with open(join(target_dir, f"test.csv"), "w") as text_file:
-        text_file.write(f"id,speaker,speech_file,speech_start,speech_end,rir_file,channel,gain,rt60\n")
+        text_file.write(f"id,speaker,speech_file,speech_start,speech_end,rir_file,channel,gain,rt60,encoding\n")
 
     test_speakers = list(data.keys())
 
@@ -375,4 +383,7 @@ if __name__ == '__main__':
             speech_cut[-ramp_samples:] = speech_cut[-ramp_samples:] * ramp[::-1]
 
             id = save_files(target_dir, "test", speaker, id, test_file, start, end, rir_file,
-                                channel, gain, rt60, mixture, speech_cut, args)
+                                channel, gain, rt60, mixture, speech_cut, writer, args)
+
+    writer.close()
+    save_index(target_dir, "test", sr=args.sr)
@@ -7,27 +7,23 @@ from glob import glob
 from os import listdir, makedirs
 from os.path import join, isdir, exists
 from argparse import ArgumentParser
-from soundfile import read, write
+from soundfile import read
 from tqdm import tqdm
+from ears_index import EMOTIONS_STYLES, find_emotion_style, save_index
+from ears_codecs import ENCODINGS, AudioWriter
 
 
 def save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, 
-               noise_file, noise_start, mixture, speech, snr_dB, args):
+               noise_file, noise_start, mixture, speech, snr_dB, writer, args):
     with open(join(target_dir, f"{subset}.csv"), "a") as text_file:
         text_file.write(f"{id:05},{speaker},{speech_file.split('/')[-1][:-4]},{speech_start},{speech_end},"
-            + f"{noise_file.split('/')[-1][:-4]},{noise_start+speech_start},{noise_start+speech_start+len(mixture)},{snr_dB:.1f}\n")
-    write(join(target_dir, subset, "noisy", speaker, f"{id:05}_{snr_dB:.1f}dB.wav"), mixture, args.sr, subtype="FLOAT")
+            + f"{noise_file.split('/')[-1][:-4]},{noise_start+speech_start},{noise_start+speech_start+len(mixture)},{snr_dB:.1f},{writer.encoding}\n")
+    writer.write(join(target_dir, subset, "noisy", speaker, f"{id:05}_{snr_dB:.1f}dB.{writer.extension}"), mixture, args.sr)
     if args.copy_clean:
-        write(join(target_dir, subset, "clean", speaker, f"{id:05}.wav"), speech, args.sr, subtype="FLOAT")
+        writer.write(join(target_dir, subset, "clean", speaker, f"{id:05}.{writer.extension}"), speech, args.sr)
     id += 1
     return id
 
-def find_emotion_style(speech_file, emotions_styles=[]):    
-    for emo_style in emotions_styles:
-        if emo_style.lower() in speech_file.lower():
-            return emo_style
-    return None
-
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -40,6 +36,8 @@ if __name__ == "__main__":
     parser.add_argument("--sr", type=int, default=48000, help="Sampling rate")
     parser.add_argument("--ramp_time_in_ms", type=int, default=10, help="Ramp time in ms")
     parser.add_argument("--max_time_test_set_in_s", type=int, default=29, help="Maximum time in seconds for the test set")
+    parser.add_argument("--encoding", type=str, default="float", choices=list(ENCODINGS), help="Encoding of the output audio files")
+    parser.add_argument("--num_workers", type=int, default=4, help="Number of threads for FLAC encoding")
     args = parser.parse_args()
 
     # Reproducibility
@@ -72,51 +70,18 @@ if __name__ == "__main__":
     # Hold out speaking styles 
     hold_out_styles = ["interjection", "melodic", "nonverbal", "vegetative"]
 
-    # Define emotions and speaking styles
-    emotions_styles = [
-        "adoration",
-        "amazement",
-        "amusement",
-        "anger",
-        "confusion",
-        "contentment",
-        "cuteness",
-        "desire",
-        "disappointment",
-        "disgust",
-        "distress",
-        "embarassment",
-        "extasy",
-        "fast",
-        "fear",
-        "guilt",
-        "highpitch",
-        "interest",
-        "loud",
-        "lowpitch",
-        "neutral",
-        "pain",
-        "pride",
-        "realization",
-        "relief",
-        "regular",
-        "sadness",
-        "serenity",
-        "slow",
-        "whisper"
-    ]
-
     # Load noisy speech 
     noise_files = glob(join(noise_dir, "high_res_wham", "audio", "*.wav")) 
 
     # DSP
     meter = pyln.Meter(args.sr)
+    writer = AudioWriter(args.encoding, num_workers=args.num_workers)
     
     # Select speech files for split
     for subset in ["train", "valid"]:
         print(f"Generate {subset} split")
         with open(join(target_dir, f"{subset}.csv"), "w") as text_file:
-            text_file.write(f"id,speaker,speech_file,speech_start,speech_end,noise_file,noise_start,noise_end,snr_dB\n")
+            text_file.write(f"id,speaker,speech_file,speech_start,speech_end,noise_file,noise_start,noise_end,snr_dB,encoding\n")
         speech_files = []
         for speaker in speakers[subset]:  
             speech_files += sorted(glob(join(speech_dir, speaker, "*.wav")))
@@ -180,18 +145,21 @@ if __name__ == "__main__":
                     mixture = long_mixture[speech_start:speech_end]
                     speech = long_speech[speech_start:speech_end]
                     id = save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, 
-                                    noise_file, noise_start, mixture, speech, snr_dB, args)
+                                    noise_file, noise_start, mixture, speech, snr_dB, writer, args)
                 speech_start = (num_splits - 1)*int(args.cut_length*args.sr)
                 speech_end = -1
                 mixture = long_mixture[speech_start:speech_end]
                 speech = long_speech[speech_start:speech_end]
                 id = save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, 
-                                noise_file, noise_start, mixture, speech, snr_dB, args)
+                                noise_file, noise_start, mixture, speech, snr_dB, writer, args)
             else:
                 speech_start = 0
                 speech_end = -1
                 id = save_files(target_dir, subset, speaker, id, speech_file, speech_start, speech_end, 
-                                noise_file, noise_start, mixture, speech, snr_dB, args)
+                                noise_file, noise_start, mixture, speech, snr_dB, writer, args)
+
+        writer.flush()
+        save_index(target_dir, subset, sr=args.sr)
 
     # ramps at beginning and end
     ramp_duration = args.ramp_time_in_ms / 1000
@@ -206,7 +174,7 @@ if __name__ == "__main__":
         data = json.load(json_file)
 
     with open(join(target_dir, f"test.csv"), "w") as text_file:
-        text_file.write(f"id,speaker,speech_file,speech_start,speech_end,noise_file,noise_start,noise_end,snr_dB\n")
+        text_file.write(f"id,speaker,speech_file,speech_start,speech_end,noise_file,noise_start,noise_end,snr_dB,encoding\n")
 
     test_files = []
     for speaker in test_speakers:
@@ -222,7 +190,7 @@ if __name__ == "__main__":
     # Ensure that the SNR is sampled uniformly for each emotion/style
     number_of_files_per_emotion = 12
     snr_bins = np.linspace(args.min_snr, args.max_snr, number_of_files_per_emotion + 1)
-    counter_emotion_style = {x: 0 for x in emotions_styles}
+    counter_emotion_style = {x: 0 for x in EMOTIONS_STYLES}
 
     id = 0
     for test_file in tqdm(test_files):
@@ -266,7 +234,7 @@ if __name__ == "__main__":
             noise_cut = noise[noise_start:noise_start+len(speech_cut)]
 
             # Sample SNR uniformly for each emotion/style, else sample uniformly between min_snr and max_snr
-            emo_style = find_emotion_style(speech_file, emotions_styles)
+            emo_style = find_emotion_style(speech_file)
             if emo_style is not None:
                 index = counter_emotion_style[emo_style] % number_of_files_per_emotion
                 min_snr = snr_bins[index]
@@ -301,4 +269,7 @@ if __name__ == "__main__":
             speech_cut[-ramp_samples:] = speech_cut[-ramp_samples:] * ramp[::-1]
 
             id = save_files(target_dir, "test", speaker, id, test_file, start, end, 
-                            noise_file, noise_start, mixture, speech_cut, snr_dB, args)
+                            noise_file, noise_start, mixture, speech_cut, snr_dB, writer, args)
+
+    writer.close()
+    save_index(target_dir, "test", sr=args.sr)